@@ -0,0 +1,181 @@
+"""
+複数台協調シミュレーション
+Linux(CPython)上で実行
+python3 Fleet-Sim.py --robots 4 --trials 8
+
+机の上で複数台を走らせ，目標の掃除割合に達するまでの時間を
+ランダム跳ね返り（従来）と協調（fleet.py）で比較する．
+協調時はループバックのUDPマルチキャストで実際にパケットを送受信する．
+実機と同じく，送信する位置・掃除済みセル・跳ね返り角度の選択には
+pose.pyの推定値（誤差を含む）を使う．--idealで真の位置を使った場合も表示する．
+"""
+
+import argparse
+import random
+
+import fleet
+import pose
+from simulator import (DESK_W_MM, DESK_H_MM, WHEEL_GAIN_L, WHEEL_GAIN_R, TRACK_MM,
+                       SUB_MS, EDGE_OFFSET_MM, FORWARD, PIVOT, Truth, turn_wait_ms)
+
+
+# ==================== シミュレーション設定 ====================
+CONTROL_MS = 100              # メインループ周期
+BROADCAST_MS = 1000           # 送信間隔
+BOUNCE_STEP_DEG = 10          # 協調時の跳ね返り角度の候補の間隔
+EDGE_RELEASE_MS = 500         # スイッチが離れてからの追加回転時間
+MAX_TIME_MS = 3600 * 1000
+
+RANDOM = "random"             # 従来のランダム跳ね返り
+ESTIMATE = "estimate"         # 推定位置で協調
+IDEAL = "ideal"               # 真の位置で協調（参考）
+LABELS = {RANDOM: "ランダム", ESTIMATE: "協調", IDEAL: "協調(真値)"}
+
+
+def random_bounce_angle(rng):
+    """main.pyと同じ跳ね返り角度の分布"""
+    if rng.randint(0, 1) == 0:
+        return rng.randint(10, 80)
+    return rng.randint(100, 170)
+
+
+def bounce_candidates(rng):
+    """main.pyと同じ協調時の候補（跳ね返り角度の範囲全体を一定間隔で）"""
+    start = rng.randint(0, BOUNCE_STEP_DEG - 1)
+    return (list(range(10 + start, 81, BOUNCE_STEP_DEG)) +
+            list(range(100 + start, 171, BOUNCE_STEP_DEG)))
+
+
+class SimRobot:
+    """1台分の走行モデル（端検出→時計回り→追加回転）と自己位置推定"""
+
+    def __init__(self, robot_id, rng, mode):
+        self.rng = rng
+        self.mode = mode
+        self.truth = Truth(rng)
+        # 開始位置は既知（main.pyのSTART_X_MMなど）
+        self.est = pose.Pose(self.truth.x, self.truth.y, self.truth.heading,
+                             DESK_W_MM, DESK_H_MM, WHEEL_GAIN_L, WHEEL_GAIN_R, TRACK_MM,
+                             edge_offset_mm=EDGE_OFFSET_MM)
+        sock = fleet.open_socket("127.0.0.1") if mode != RANDOM else None
+        self.fleet = fleet.Fleet(robot_id, DESK_W_MM, DESK_H_MM, sock)
+        self.state = "forward"
+        self.remaining = 0
+        self.command(FORWARD)
+        self.fleet.mark(*self.pose()[:2])
+
+    def close(self):
+        if self.fleet.sock is not None:
+            self.fleet.sock.close()
+
+    def pose(self):
+        """協調に使う位置（推定値，--idealでは真値）"""
+        if self.mode == IDEAL:
+            t = self.truth
+            return t.x, t.y, t.heading
+        return self.est.get()
+
+    def command(self, lr):
+        self.truth.left, self.truth.right = lr
+        self.est.command(*lr)
+
+    def step(self, cells):
+        """CONTROL_MS分進める（main.pyのメインループ1回分）"""
+        tx, ty = self.truth.x, self.truth.y
+        px, py, _ = self.pose()
+        for _ in range(CONTROL_MS // SUB_MS):
+            self.truth.step(SUB_MS)
+            self.est.update(SUB_MS)
+        cells.sweep(tx, ty, self.truth.x, self.truth.y)
+        x, y, _ = self.pose()
+        self.fleet.sweep(px, py, x, y)
+
+        if self.state == "forward":
+            if self.truth.switch_off_desk():
+                # 端検出: スイッチが離れるまで時計回り
+                self.est.edge_hit()
+                self.command(PIVOT)
+                self.state = "release"
+        elif self.state == "release":
+            if not self.truth.switch_off_desk():
+                self.remaining = EDGE_RELEASE_MS
+                self.state = "settle"
+        elif self.state == "settle":
+            self.remaining -= CONTROL_MS
+            if self.remaining <= 0:
+                self.bounce()
+        elif self.state == "turn":
+            self.remaining -= CONTROL_MS
+            if self.remaining <= 0:
+                self.command(FORWARD)
+                self.state = "forward"
+
+    def bounce(self):
+        """追加回転の角度を選ぶ（edge_detected_handlerの再現）"""
+        if self.mode == RANDOM:
+            angle = random_bounce_angle(self.rng)
+        else:
+            self.fleet.poll()
+            candidates = bounce_candidates(self.rng)
+            options = []
+            for a in candidates:
+                ms = turn_wait_ms(self.est, a, PIVOT, True)
+                options.append(self.est.predict(*PIVOT, ms) + (ms,))
+            speed = self.est.motion(*FORWARD)[0]
+            angle = candidates[self.fleet.choose_turn(options, speed)]
+        # 協調時に推奨する MODEL_TURN_TIMING = True と同じく，片輪回転の時間はモデルから求める
+        self.remaining = turn_wait_ms(self.est, angle, PIVOT, True)
+        self.state = "turn"
+
+
+def run_trial(n, mode, target, seed):
+    """目標の掃除割合に達するまでの時間（秒）を返す"""
+    rng = random.Random(seed)
+    robots = [SimRobot(i + 1, rng, mode) for i in range(n)]
+    cells = fleet.Fleet(0, DESK_W_MM, DESK_H_MM)  # 実際に掃除されたセル（全台の和）
+    t = 0
+    next_broadcast = 0
+    try:
+        while t < MAX_TIME_MS:
+            for r in robots:
+                r.step(cells)
+            if mode != RANDOM:
+                if t >= next_broadcast:
+                    for r in robots:
+                        r.fleet.broadcast(*r.pose())
+                    next_broadcast += BROADCAST_MS
+                for r in robots:
+                    r.fleet.poll()
+            if cells.coverage() >= target:
+                return t / 1000
+            t += CONTROL_MS
+        return MAX_TIME_MS / 1000
+    finally:
+        for r in robots:
+            r.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="複数台協調シミュレーション")
+    parser.add_argument("--robots", type=int, default=4, help="最大台数")
+    parser.add_argument("--trials", type=int, default=8, help="条件ごとの試行回数")
+    parser.add_argument("--target", type=float, default=0.9, help="目標の掃除割合")
+    parser.add_argument("--ideal", action="store_true", help="真の位置で協調した場合も表示")
+    args = parser.parse_args()
+
+    modes = [RANDOM, ESTIMATE] + ([IDEAL] if args.ideal else [])
+    print(f"机 {DESK_W_MM}x{DESK_H_MM}mm, 目標 {args.target * 100:.0f}%")
+    print("台数  方式        平均時間(s)  同じ方式の1台比  ランダム1台比")
+    base = {}
+    for n in range(1, args.robots + 1):
+        for mode in modes:
+            times = [run_trial(n, mode, args.target, seed)
+                     for seed in range(args.trials)]
+            mean = sum(times) / len(times)
+            base.setdefault(mode, mean)
+            print(f"{n:>4}  {LABELS[mode]:<10}  {mean:>10.1f}  "
+                  f"{base[mode] / mean:>14.2f}x  {base[RANDOM] / mean:>12.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""
+パラメータ調整ツール（PC側）
+Linux/Windows/macOS上で実行（pyserialが必要: pip install pyserial）
+
+python3 Param-Tune.py --port /dev/ttyACM0 list
+python3 Param-Tune.py --port /dev/ttyACM0 set rotation_ddeg_s 550
+python3 Param-Tune.py --port /dev/ttyACM0 save
+python3 Param-Tune.py --port /dev/ttyACM0 sweep edge_release_ms 300 900 100 --dwell 60 --out sweep.csv
+
+sweepは値を順に変えながら走らせ，各値でstatの差分（端検出・磁石検出の回数，
+掃除済み割合の増加）をCSVに記録する．終わったら元の値に戻す．
+"""
+
+import argparse
+import csv
+import sys
+import time
+
+
+BAUD = 115200
+TIMEOUT = 5.0   # 応答待ちの上限（秒）。端の処理中は応答が遅れる
+
+
+class Link:
+    """Picoとのコマンドのやりとり（"@"で始まる行だけを応答として扱う）"""
+
+    def __init__(self, port, baud=BAUD):
+        try:
+            import serial
+        except ImportError:
+            sys.exit("pyserialがありません: pip install pyserial")
+        self.serial = serial.Serial(port, baud, timeout=0.1)
+        self.pending = b""
+
+    def readline(self):
+        """1行読む（行の途中でタイムアウトしたら次回に続きを読む）"""
+        self.pending += self.serial.readline()
+        if not self.pending.endswith(b"\n"):
+            return ""
+        line, self.pending = self.pending, b""
+        return line.decode("utf-8", "replace").strip()
+
+    def drain(self, seconds):
+        """指定時間，ログを読み捨てる（Pico側の出力が詰まらないように）"""
+        end = time.monotonic() + seconds
+        while time.monotonic() < end:
+            self.readline()
+
+    def send(self, line):
+        """コマンドを送り，応答（"OK"以降）を返す"""
+        self.serial.reset_input_buffer()
+        self.pending = b""
+        self.serial.write((line + "\n").encode())
+        end = time.monotonic() + TIMEOUT
+        while time.monotonic() < end:
+            reply = self.readline()
+            if not reply.startswith("@"):
+                continue
+            reply = reply[1:]
+            if reply.startswith("ERR"):
+                raise RuntimeError("%s: %s" % (line, reply))
+            return reply[3:]
+        raise RuntimeError("%s: 応答がありません" % line)
+
+    def values(self, line):
+        """「名前=値」の並びの応答を辞書にする"""
+        result = {}
+        for item in self.send(line).split():
+            key, _, value = item.partition("=")
+            result[key] = float(value)
+        return result
+
+
+def frange(start, stop, step):
+    values = []
+    v = start
+    while v <= stop + step * 1e-9:
+        values.append(round(v, 6))
+        v += step
+    return values
+
+
+def sweep(link, args):
+    """パラメータを順に変えて結果をCSVに記録"""
+    original = link.values("get " + args.name)[args.name]
+    print(f"{args.name}: 元の値 {original}")
+    with open(args.out, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow([args.name, "seconds", "edges", "magnets",
+                         "edges_per_min", "coverage_gain"])
+        try:
+            for value in frange(args.start, args.stop, args.step):
+                link.send("set %s %s" % (args.name, value))
+                before = link.values("stat")
+                link.drain(args.dwell)
+                after = link.values("stat")
+                seconds = (after["t_ms"] - before["t_ms"]) / 1000.0
+                edges = after["edges"] - before["edges"]
+                magnets = after["magnets"] - before["magnets"]
+                coverage = after.get("coverage", 0.0) - before.get("coverage", 0.0)
+                row = [value, round(seconds, 1), int(edges), int(magnets),
+                       round(edges * 60 / seconds, 2), round(coverage, 4)]
+                writer.writerow(row)
+                f.flush()
+                print("  ".join(str(x) for x in row))
+        finally:
+            if not args.keep:
+                link.send("set %s %s" % (args.name, original))
+                print(f"{args.name}: {original} に戻しました")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="パラメータ調整ツール")
+    parser.add_argument("--port", required=True, help="シリアルポート（例: /dev/ttyACM0, COM3）")
+    parser.add_argument("--baud", type=int, default=BAUD)
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("list", help="すべての値を表示")
+    sub.add_parser("stat", help="走行の記録を表示")
+    sub.add_parser("save", help="フラッシュに保存")
+    sub.add_parser("load", help="フラッシュから読み込み")
+    sub.add_parser("reset", help="初期値に戻す")
+    p = sub.add_parser("get", help="値を表示")
+    p.add_argument("name")
+    p = sub.add_parser("set", help="値を変更")
+    p.add_argument("name")
+    p.add_argument("value")
+    p = sub.add_parser("sweep", help="値を順に変えて結果を記録")
+    p.add_argument("name")
+    p.add_argument("start", type=float)
+    p.add_argument("stop", type=float)
+    p.add_argument("step", type=float)
+    p.add_argument("--dwell", type=float, default=60.0, help="1つの値で走らせる時間（秒）")
+    p.add_argument("--out", default="sweep.csv", help="結果のCSVファイル")
+    p.add_argument("--keep", action="store_true", help="終了後も最後の値のままにする")
+    args = parser.parse_args()
+
+    link = Link(args.port, args.baud)
+    try:
+        if args.command == "sweep":
+            sweep(link, args)
+        elif args.command == "get":
+            print(link.send("get " + args.name))
+        elif args.command == "set":
+            print(link.send("set %s %s" % (args.name, args.value)))
+        else:
+            print(link.send(args.command))
+    except RuntimeError as e:
+        sys.exit(str(e))
+
+
+if __name__ == "__main__":
+    main()
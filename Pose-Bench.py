@@ -0,0 +1,37 @@
+"""
+自己位置推定の処理時間測定
+Raspberry Pi Pico W用
+MicroPython
+
+pose.pyと一緒にPicoに書き込んで実行する．
+メインループ1回分（100ms）のupdate()にかかる時間とメモリ確保量を表示する．
+"""
+
+import gc
+import time
+
+import pose
+
+
+CONTROL_MS = 100   # main.pyのメインループ周期
+COUNT = 1000       # 測定回数
+
+est = pose.Pose(600, 450, 0, 1200, 900, 100 / 20000, 100 / 24000, 350)
+
+for name, left, right in (("前進", 20000, 24000), ("回転", 40000, -40000)):
+    est.command(left, right)
+    total = 0
+    worst = 0
+    gc.collect()
+    free = gc.mem_free()
+    for i in range(COUNT):
+        est.x = 600 * pose.POS_ONE   # 机の端に張り付かないように戻す
+        est.y = 450 * pose.POS_ONE
+        start = time.ticks_us()
+        est.update(CONTROL_MS)
+        t = time.ticks_diff(time.ticks_us(), start)
+        total += t
+        if t > worst:
+            worst = t
+    used = free - gc.mem_free()
+    print(name, "平均", total // COUNT, "us  最大", worst, "us  確保", used, "bytes")
@@ -0,0 +1,143 @@
+"""
+自己位置推定シミュレーション
+Linux(CPython)上で実行
+python3 Pose-Sim.py --seconds 300 --trials 20
+
+車輪の係数や車輪間隔に誤差のある「実機」を走らせ，pose.pyの推定値との
+ずれを補正の有無・IMUの有無で比較する．あわせて1回の更新にかかる時間を測る
+（PC上の値なので参考。Pico上の時間はPose-Bench.pyで測る）．
+"""
+
+import argparse
+import math
+import random
+import time
+
+import pose
+from simulator import (DESK_W_MM, DESK_H_MM, WHEEL_GAIN_L, WHEEL_GAIN_R, TRACK_MM,
+                       SUB_MS, EDGE_OFFSET_MM, FORWARD, SPIN, PIVOT, Truth, turn_wait_ms)
+
+
+# ==================== シミュレーション設定 ====================
+CONTROL_MS = 100              # メインループ周期
+LANDMARKS = [(300, 450), (900, 450), (600, 200), (600, 700)]
+LANDMARK_GATE_MM = 150
+MAGNET_RADIUS_MM = 20         # 磁気センサーが反応する距離
+
+# 比較する設定: 名前, 端補正, 目印補正, ジャイロの重み
+CONFIGS = [
+    ("指令のみ", False, False, 0),
+    ("+端", True, False, 0),
+    ("+端+磁石", True, True, 0),
+    ("+端+磁石+IMU", True, True, 224),
+]
+
+
+def run_trial(seconds, edge, landmarks, gyro_weight, seed):
+    """位置誤差のRMS・最大値（mm）と向き誤差の平均（°）を返す"""
+    rng = random.Random(seed)
+    truth = Truth(rng)
+    est = pose.Pose(truth.x, truth.y, truth.heading, DESK_W_MM, DESK_H_MM,
+                    WHEEL_GAIN_L, WHEEL_GAIN_R, TRACK_MM, gyro_weight,
+                    edge_offset_mm=EDGE_OFFSET_MM)
+
+    def command(lr):
+        truth.left, truth.right = lr
+        est.command(*lr)
+
+    def advance(ms):
+        for _ in range(ms // SUB_MS):
+            truth.step(SUB_MS)
+            est.update(SUB_MS, truth.gyro() if gyro_weight else None)
+
+    state = "forward"
+    remaining = 0
+    magnet_cooldown = 0
+    command(FORWARD)
+    sq = 0.0
+    worst = 0.0
+    head = 0.0
+    n = 0
+    for _ in range(seconds * 1000 // CONTROL_MS):
+        advance(CONTROL_MS)
+        if state == "forward":
+            if truth.switch_off_desk():
+                # 端検出: 時計回りに旋回
+                if edge:
+                    est.edge_hit()
+                command(PIVOT)
+                state = "release"
+            elif magnet_cooldown <= 0 and truth.near_magnet(LANDMARKS, MAGNET_RADIUS_MM):
+                if landmarks:
+                    est.landmark(LANDMARKS, LANDMARK_GATE_MM)
+                command(SPIN)
+                remaining = 1500          # 90°
+                magnet_cooldown = 3000
+                state = "turn"
+        elif state == "release":
+            if not truth.switch_off_desk():
+                angle = rng.choice((rng.randint(10, 80), rng.randint(100, 170)))
+                # main.pyのrotate()の初期設定（MODEL_TURN_TIMING = False）と同じ待ち時間
+                remaining = 500 + turn_wait_ms(est, angle, PIVOT, False)
+                state = "turn"
+        elif state == "turn":
+            remaining -= CONTROL_MS
+            if remaining <= 0:
+                command(FORWARD)
+                state = "forward"
+        magnet_cooldown -= CONTROL_MS
+
+        x, y, h = est.get()
+        err = math.hypot(x - truth.x, y - truth.y)
+        sq += err * err
+        worst = max(worst, err)
+        head += abs((h - truth.heading + 180) % 360 - 180)
+        n += 1
+    return math.sqrt(sq / n), worst, head / n
+
+
+def update_cost(count=20000):
+    """1回の更新（CONTROL_MS分の積分）にかかる時間（µs，このPC上のCPython）"""
+    est = pose.Pose(600, 450, 0, DESK_W_MM, DESK_H_MM,
+                    WHEEL_GAIN_L, WHEEL_GAIN_R, TRACK_MM)
+    est.command(*FORWARD)
+    start = time.perf_counter()
+    for _ in range(count):
+        est.update(CONTROL_MS)
+        est.x = 600 * pose.POS_ONE   # 机の端に張り付かないように戻す
+    return (time.perf_counter() - start) / count * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="自己位置推定シミュレーション")
+    parser.add_argument("--seconds", type=int, default=300, help="1試行の走行時間")
+    parser.add_argument("--trials", type=int, default=20,
+                        help="設定ごとの試行回数（走行経路による差が大きいので多めに）")
+    args = parser.parse_args()
+
+    print(f"机 {DESK_W_MM}x{DESK_H_MM}mm, {args.seconds}秒 x {args.trials}回")
+    print("設定              RMS(mm)  最大(mm)  試行ごとの最大の平均(mm)  向き(°)  "
+          "RMSが指令のみより良い試行  最大が指令のみより悪い試行")
+    base = None
+    for name, edge, landmarks, gyro_weight in CONFIGS:
+        results = [run_trial(args.seconds, edge, landmarks, gyro_weight, seed)
+                   for seed in range(args.trials)]
+        rms = sum(r[0] for r in results) / len(results)
+        worst = max(r[1] for r in results)
+        mean_worst = sum(r[1] for r in results) / len(results)
+        head = sum(r[2] for r in results) / len(results)
+        if base is None:
+            base = results
+            wins = losses = "-"
+        else:
+            # 同じ走行経路（seed）どうしで比べる
+            wins = f"{sum(r[0] < b[0] for r, b in zip(results, base))}/{len(results)}"
+            losses = f"{sum(r[1] > b[1] for r, b in zip(results, base))}/{len(results)}"
+        print(f"{name:<14}  {rms:>8.1f}  {worst:>8.1f}  {mean_worst:>22.1f}  {head:>7.1f}  "
+              f"{wins:>24}  {losses:>24}")
+    print(f"更新1回あたり {update_cost():.1f}µs（このPC上のCPython，{CONTROL_MS}ms分の積分）")
+    print("※ Pico上の時間とは異なる。実機ではPose-Bench.pyで測ること")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,231 @@
+"""
+複数台協調モジュール
+Raspberry Pi Pico W用 / Linux上のシミュレーションでも共通で使用
+MicroPython / CPython
+
+各ロボットが推定位置と掃除済みセルをUDPマルチキャストで送信し，
+掃除済みの場所と他の個体の進路の先を避けるように跳ね返り角度を選ぶ．
+"""
+
+import socket
+import struct
+import math
+
+try:
+    import network
+except ImportError:  # Linux(CPython)上ではWi-Fi接続は不要
+    network = None
+
+
+# ==================== 通信設定 ====================
+GROUP = "239.7.7.7"   # マルチキャストグループ
+PORT = 5077           # UDPポート
+CELL_MM = 50          # 掃除済みマップの1セルの大きさ（mm）
+
+# パケット: マジック, ID, 連番, x(mm), y(mm), 向き(°), 列数, 行数 + ビットマップ
+MAGIC = b"GE"
+HEADER = "<2sBBhhhBB"
+HEADER_SIZE = struct.calcsize(HEADER)
+
+
+def _aton(addr):
+    """IPv4アドレス文字列を4バイトに変換（MicroPythonにはinet_atonが無い）"""
+    return bytes(int(part) for part in addr.split("."))
+
+
+def connect_wifi(ssid, password, timeout_ms=10000):
+    """Wi-Fiに接続してIPアドレスを返す（失敗時はNone）"""
+    if network is None:
+        return None
+    import time
+
+    wlan = network.WLAN(network.STA_IF)
+    wlan.active(True)
+    wlan.connect(ssid, password)
+    start = time.ticks_ms()
+    while not wlan.isconnected():
+        if time.ticks_diff(time.ticks_ms(), start) > timeout_ms:
+            return None
+        time.sleep(0.1)
+    return wlan.ifconfig()[0]
+
+
+def open_socket(iface="0.0.0.0", group=GROUP, port=PORT):
+    """マルチキャスト送受信用のノンブロッキングUDPソケットを作成"""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    if hasattr(socket, "SO_REUSEPORT"):
+        # 同じPC上で複数台をシミュレーションする場合に必要
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind(("0.0.0.0", port))
+    sock.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP,
+                    _aton(group) + _aton(iface))
+    if hasattr(socket, "IP_MULTICAST_IF"):
+        sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_IF, _aton(iface))
+    if hasattr(socket, "IP_MULTICAST_LOOP"):
+        sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_LOOP, 1)
+    sock.setblocking(False)
+    return sock
+
+
+# ==================== 協調制御 ====================
+class Fleet:
+    """掃除済みマップの共有と跳ね返り角度の選択"""
+
+    def __init__(self, robot_id, desk_w, desk_h, sock=None,
+                 cell=CELL_MM, group=GROUP, port=PORT):
+        self.robot_id = robot_id
+        self.cell = cell
+        self.cols = (desk_w + cell - 1) // cell
+        self.rows = (desk_h + cell - 1) // cell
+        nbytes = (self.cols * self.rows + 7) // 8
+        self.own = bytearray(nbytes)    # 自分が掃除したセル
+        self.peer = bytearray(nbytes)   # 他の個体が掃除したセル（和集合）
+        self.peers = {}                 # ID -> (x, y, 向き)
+        self.sock = sock
+        self.dest = (group, port)
+        self.seq = 0
+
+    # ---------- マップ操作 ----------
+    def _index(self, x, y):
+        """座標(mm)をセル番号に変換（机の外はNone）"""
+        c = int(x) // self.cell
+        r = int(y) // self.cell
+        if c < 0 or r < 0 or c >= self.cols or r >= self.rows:
+            return None
+        return r * self.cols + c
+
+    def is_covered(self, x, y):
+        """誰かが既に掃除したセルかどうか"""
+        i = self._index(x, y)
+        if i is None:
+            return True
+        bit = 1 << (i & 7)
+        return bool((self.own[i >> 3] | self.peer[i >> 3]) & bit)
+
+    def mark(self, x, y):
+        """現在位置のセルを掃除済みにする"""
+        i = self._index(x, y)
+        if i is not None:
+            self.own[i >> 3] |= 1 << (i & 7)
+
+    def sweep(self, x0, y0, x1, y1):
+        """線分上のセルをすべて掃除済みにする"""
+        dx = x1 - x0
+        dy = y1 - y0
+        steps = int(max(abs(dx), abs(dy)) * 2 // self.cell) + 1
+        for k in range(steps + 1):
+            self.mark(x0 + dx * k / steps, y0 + dy * k / steps)
+
+    def coverage(self):
+        """全体の掃除済み割合（0.0〜1.0）"""
+        total = 0
+        for a, b in zip(self.own, self.peer):
+            total += bin(a | b).count("1")
+        return total / (self.cols * self.rows)
+
+    # ---------- 通信 ----------
+    def pack(self, x, y, heading):
+        """自分の位置と掃除済みセルをパケットにする"""
+        self.seq = (self.seq + 1) & 0xFF
+        header = struct.pack(HEADER, MAGIC, self.robot_id, self.seq,
+                             int(x), int(y), int(heading) % 360,
+                             self.cols, self.rows)
+        return header + bytes(self.own)
+
+    def receive(self, data):
+        """受信パケットを取り込む（自分の送信分・不正なものは無視）"""
+        if len(data) != HEADER_SIZE + len(self.own):
+            return False
+        magic, rid, _, x, y, heading, cols, rows = struct.unpack(
+            HEADER, data[:HEADER_SIZE])
+        if magic != MAGIC or rid == self.robot_id:
+            return False
+        if cols != self.cols or rows != self.rows:
+            return False
+        self.peers[rid] = (x, y, heading)
+        for i in range(len(self.peer)):
+            self.peer[i] |= data[HEADER_SIZE + i]
+        return True
+
+    def broadcast(self, x, y, heading):
+        """自分の状態を送信"""
+        if self.sock is None:
+            return
+        try:
+            self.sock.sendto(self.pack(x, y, heading), self.dest)
+        except OSError:
+            pass  # 送信失敗は次回の送信で補う
+
+    def poll(self):
+        """受信済みのパケットをすべて取り込む（ブロックしない）"""
+        if self.sock is None:
+            return
+        while True:
+            try:
+                data, _ = self.sock.recvfrom(HEADER_SIZE + len(self.own))
+            except OSError:
+                return
+            self.receive(data)
+
+    # ---------- 跳ね返り角度の選択 ----------
+    def _claim(self, reach):
+        """他の個体がこれから通る場所（受信した位置から向きの先）のセルを返す"""
+        claimed = bytearray(len(self.own))
+        step = self.cell / 2
+        for x, y, heading in self.peers.values():
+            rad = math.radians(heading)
+            dx = math.cos(rad) * step
+            dy = math.sin(rad) * step
+            for k in range(int(reach / step) + 1):
+                i = self._index(x + dx * k, y + dy * k)
+                if i is None:
+                    break
+                claimed[i >> 3] |= 1 << (i & 7)
+        return claimed
+
+    def score_path(self, x, y, heading, claimed=None):
+        """その向きに机の端まで進んだときの (未掃除の割合を掛けた距離, 距離) を返す
+        （推定位置の誤差を考えて，進路の左右1セルずつを含めた帯で数える）"""
+        rad = math.radians(heading)
+        dx = math.cos(rad)
+        dy = math.sin(rad)
+        step = self.cell / 2
+        side = (-dy * self.cell, 0, dy * self.cell)
+        side_y = (dx * self.cell, 0, -dx * self.cell)
+        fresh = 0
+        d = step
+        while True:
+            px = x + dx * d
+            py = y + dy * d
+            if self._index(px, py) is None:
+                break  # 机の端まで到達
+            for ox, oy in zip(side, side_y):
+                i = self._index(px + ox, py + oy)
+                if i is None:
+                    continue
+                bit = 1 << (i & 7)
+                covered = self.own[i >> 3] | self.peer[i >> 3]
+                if claimed is not None:
+                    covered |= claimed[i >> 3]
+                if not covered & bit:
+                    fresh += 1
+            d += step
+        return fresh * step / 3, d
+
+    def choose_turn(self, options, speed, reach=None):
+        """回転後の姿勢の候補 (x, y, 向き, 回転にかかる時間ms) のうち，
+        未掃除の場所を単位時間あたり最も多く通るものの番号を返す
+        （speed: 前進速度 mm/s．他の個体の進路の先は掃除済みとみなす）"""
+        if reach is None:
+            reach = (self.cols + self.rows) * self.cell
+        claimed = self._claim(reach) if self.peers else None
+        best = 0
+        best_rate = -1.0
+        for k, (x, y, heading, turn_ms) in enumerate(options):
+            fresh, length = self.score_path(x, y, heading, claimed)
+            rate = fresh / (length + speed * turn_ms / 1000)
+            if rate > best_rate:
+                best = k
+                best_rate = rate
+        return best
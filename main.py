@@ -8,6 +8,8 @@ from machine import Pin, PWM
 import time
 import random
 import _thread
+import params
+import pose
 
 
 # ==================== GPIO設定 ====================
@@ -38,6 +40,84 @@ mouth_pwm.freq(50)                # 50Hz
 # オンボードLED（デバッグ用）
 led = Pin("LED", Pin.OUT)
 
+# ==================== 複数台協調設定 ====================
+FLEET_ENABLED = False        # 複数台で同じ机を掃除する場合はTrue
+ROBOT_ID = 1                 # 個体ごとに異なる番号（1〜255）
+WIFI_SSID = ""
+WIFI_PASSWORD = ""
+BROADCAST_INTERVAL_MS = 1000 # 位置と掃除済みセルの送信間隔
+BOUNCE_STEP_DEG = 10         # 跳ね返り角度の候補の間隔（範囲全体をこの間隔で調べる）
+
+# 机の大きさと開始位置（全個体で共通の座標系，単位mm）
+# 向きは+x方向が0°で時計回りが正（y軸は下向き）
+DESK_W_MM = 1200
+DESK_H_MM = 900
+START_X_MM = 100
+START_Y_MM = 100
+START_HEADING = 0
+
+# ==================== 自己位置推定設定 ====================
+# 車輪速度 = duty × 係数（mm/s，要実測）
+WHEEL_GAIN_L = 100 / 20000
+WHEEL_GAIN_R = 100 / 24000
+# 実効車輪間隔（mm）の初期値：その場回転が rotation_ddeg_s になる値
+# （calibrate_turn()で rotation_ddeg_s から合わせ直す）
+TRACK_MM = 350
+GYRO_WEIGHT = 0              # IMUを使う場合のジャイロの重み（0〜256）
+EDGE_GAIN = 224              # 端検出での位置補正の強さ（0〜256）
+LANDMARK_GAIN = 224          # 磁石の目印での位置補正の強さ（0〜256）
+HEADING_GAIN = 192           # 端での補正量から向きを補正する強さ（0〜256）
+# 回転を待つ時間を推定のモデル（WHEEL_GAIN_L/R）から求めるか．
+# False: 片輪・両輪とも rotation_ddeg_s で待つ（従来どおり）
+# True: 片輪の回転を実際の速さで待つ（WHEEL_GAIN_L/R を実測してから使う．協調時は推奨）
+MODEL_TURN_TIMING = False
+EDGE_OFFSET_MM = 40          # 中心からマイクロスイッチまでの距離（要実測）
+# 机に置いた磁石の位置（mm）と，対応付ける距離の上限
+MAGNET_LANDMARKS = []
+LANDMARK_GATE_MM = 150
+
+# ==================== 調整パラメータ ====================
+MIN_ROTATION_DUTY = 10000    # 回転時のdutyの下限（これ未満ではモータが回らない，要実測）
+MAX_TURN_MS = 8000           # 1回の回転で待つ時間の上限（この間はコンソールも止まる）
+# USBシリアルから走行中に読み書きできる値（コマンドはparams.py参照）
+# (名前, 型, 初期値, 最小値, 最大値)
+# 回転のdutyは MIN_ROTATION_DUTY 未満だとモータが回らず回転が終わらないので受け付けない
+PARAM_TABLE = (
+    ("forward_left", "H", 20000, 0, 65535),    # 前進時の左duty
+    ("forward_right", "H", 24000, 0, 65535),   # 前進時の右duty
+    ("rotation_left", "H", 40000, MIN_ROTATION_DUTY, 65535),   # 回転時の左duty
+    ("rotation_right", "H", 40000, MIN_ROTATION_DUTY, 65535),  # 回転時の右duty
+    ("edge_rotation", "H", 40000, MIN_ROTATION_DUTY, 65535),  # 端から離れるまでの回転duty
+    ("rotation_ddeg_s", "H", 600, 100, 3600),  # その場回転の速度（0.1°/s単位，600 = 60°/s）
+    ("edge_release_ms", "H", 500, 0, 5000),    # スイッチが離れてからの追加回転時間
+    ("bounce_min_1", "H", 10, 0, 180),         # 跳ね返り角度の範囲1
+    ("bounce_max_1", "H", 80, 0, 180),
+    ("bounce_min_2", "H", 100, 0, 180),        # 跳ね返り角度の範囲2
+    ("bounce_max_2", "H", 170, 0, 180),
+    ("mouth_step_ms", "H", 40, 1, 1000),       # 口の開閉1ステップの待ち時間
+)
+# 常に 左 <= 右 を満たす組（randintの範囲）
+PARAM_ORDER = (
+    ("bounce_min_1", "bounce_max_1"),
+    ("bounce_min_2", "bounce_max_2"),
+)
+settings = params.Params(PARAM_TABLE, PARAM_ORDER)
+settings.load()                      # 保存済みの値があれば読み込む
+
+# 調整結果の記録用カウンタ（statコマンドで表示）
+edge_count = 0
+magnet_count = 0
+
+# ==================== 自己位置 ====================
+estimator = pose.Pose(START_X_MM, START_Y_MM, START_HEADING, DESK_W_MM, DESK_H_MM,
+                      WHEEL_GAIN_L, WHEEL_GAIN_R, TRACK_MM,
+                      gyro_weight=GYRO_WEIGHT, edge_gain=EDGE_GAIN,
+                      landmark_gain=LANDMARK_GAIN, edge_offset_mm=EDGE_OFFSET_MM,
+                      heading_gain=HEADING_GAIN)
+pose_x, pose_y, pose_heading = estimator.get()  # 最新の推定値（mm, mm, °）
+pose_ms = time.ticks_ms()    # 最後に推定値を更新した時刻
+coordinator = None           # fleet.Fleet（協調無効時はNone）
+
 # ==================== モータ制御関数 ====================
 def drive_motor(in1_pwm, in2_pwm, speed):
     """モータ駆動ヘルパー関数（PWMで速度制御）"""
@@ -58,9 +138,16 @@ def drive_motor(in1_pwm, in2_pwm, speed):
 
 def drive(left_speed, right_speed):
     """左右モータ制御"""
+    update_pose()
+    estimator.command(left_speed, right_speed)
     drive_motor(motor_m1a, motor_m1b, right_speed)
     drive_motor(motor_m2a, motor_m2b, left_speed)
 
+def stop_motors():
+    """モータを止める（推定の更新をしないので，例外の後でも使える）"""
+    drive_motor(motor_m1a, motor_m1b, 0)
+    drive_motor(motor_m2a, motor_m2b, 0)
+
 def set_mouth_angle(angle):
     """サーボモータの角度設定（0〜180度）"""
     # FT90B仕様: 500us(0°)〜2500us(180°)
@@ -75,19 +162,60 @@ def set_mouth_angle(angle):
     duty = int(min_duty + (max_duty - min_duty) * angle / 180)
     mouth_pwm.duty_u16(duty)
 
+# ==================== 自己位置更新 ====================
+def read_gyro():
+    """IMUのz軸角速度（mdeg/s，時計回りが正）。IMU未接続時はNone"""
+    return None
+
+def update_pose():
+    """前回からの経過時間分だけ自己位置を推定し，通過したセルを掃除済みにする"""
+    global pose_x, pose_y, pose_heading, pose_ms
+    now = time.ticks_ms()
+    estimator.update(time.ticks_diff(now, pose_ms), read_gyro())
+    pose_ms = now
+    x, y, pose_heading = estimator.get()
+    if coordinator is not None:
+        coordinator.sweep(pose_x, pose_y, x, y)
+    pose_x, pose_y = x, y
+
+def calibrate_turn():
+    """その場回転の角速度が rotation_ddeg_s になるように推定のモデルを合わせる"""
+    estimator.set_turn_rate(settings.get("rotation_left"), -settings.get("rotation_right"),
+                            settings.get("rotation_ddeg_s") / 10)
+
+def sync_pose():
+    """補正後の推定値を反映（補正による移動は掃除済みにしない）"""
+    global pose_x, pose_y, pose_heading
+    pose_x, pose_y, pose_heading = estimator.get()
+
+def correct_landmark():
+    """磁石を検出したとき，登録済みの目印で自己位置を補正"""
+    global magnet_count
+    magnet_count += 1
+    update_pose()
+    if estimator.landmark(MAGNET_LANDMARKS, LANDMARK_GATE_MM):
+        sync_pose()
+
 # ==================== 走行制御 ====================
 def start_forward():
     """前進開始"""
-    RIGHT_SPEED = 24000
-    LEFT_SPEED = 20000
     # print("走行開始")
-    drive(LEFT_SPEED, RIGHT_SPEED)
+    drive(settings.get("forward_left"), settings.get("forward_right"))
 
 # ==================== 回転制御 ====================
+def turn_wait_ms(angle, l_speed, r_speed):
+    """angle°回るのに待つ時間（ms，MAX_TURN_MSまで）"""
+    if MODEL_TURN_TIMING:
+        # 片輪だけの回転（端検出時）はその場回転より遅いので，推定のモデルから求める
+        deg_s = abs(estimator.motion(l_speed, r_speed)[1])
+    else:
+        deg_s = settings.get("rotation_ddeg_s") / 10
+    return min(abs(angle) * 1000 / deg_s, MAX_TURN_MS)
+
 def rotate(angle, edge):
     """回転制御（正:時計回り, 負:反時計回り）"""
-    LEFT_ROTATION_SPEED = 40000
-    RIGHT_ROTATION_SPEED = 40000
+    LEFT_ROTATION_SPEED = settings.get("rotation_left")
+    RIGHT_ROTATION_SPEED = settings.get("rotation_right")
     print(f"回転 {angle}°")
     
     if edge:
@@ -98,23 +226,53 @@ def rotate(angle, edge):
     # 時計回り: 左正転・右逆転, 反時計: 左逆転・右正転
     r_speed = -RIGHT_ROTATION_SPEED if angle > 0 else RIGHT_ROTATION_SPEED
     
+    calibrate_turn()
     drive(l_speed, r_speed)
-    time.sleep(abs(angle) / 60.0) # 回転し終わるまで待機
+    time.sleep(turn_wait_ms(angle, l_speed, r_speed) / 1000.0) # 回転し終わるまで待機
 
     print("回転終了")
     
     start_forward()
 
 # ==================== 端検出処理 ====================
+def random_bounce_angle():
+    """跳ね返りの追加回転角度（初期値は10°～80°または100°～170°）"""
+    if random.randint(0, 1) == 0:
+        return random.randint(settings.get("bounce_min_1"), settings.get("bounce_max_1"))
+    return random.randint(settings.get("bounce_min_2"), settings.get("bounce_max_2"))
+
+def bounce_candidates():
+    """協調時の跳ね返り角度の候補（2つの範囲全体を BOUNCE_STEP_DEG 間隔で）"""
+    start = random.randint(0, BOUNCE_STEP_DEG - 1)
+    candidates = []
+    for low, high in (("bounce_min_1", "bounce_max_1"), ("bounce_min_2", "bounce_max_2")):
+        candidates += range(settings.get(low) + start, settings.get(high) + 1, BOUNCE_STEP_DEG)
+    return candidates or [random_bounce_angle()]
+
+def bounce_options(candidates):
+    """候補の角度ごとに，rotate(angle, True)で回ったあとの (x, y, 向き, 回転時間ms) を予測"""
+    calibrate_turn()
+    options = []
+    for angle in candidates:
+        r_speed = -settings.get("rotation_right") if angle > 0 else settings.get("rotation_right")
+        ms = turn_wait_ms(angle, 0, r_speed)
+        options.append(estimator.predict(0, r_speed, ms) + (ms,))
+    return options
+
 def edge_detected_handler():
     """端検出時の処理"""
+    global edge_count
+    edge_count += 1
     print("!!! 端を検出 !!! sensor value:", edge_sensor.value())
+    update_pose()
+    estimator.edge_hit()
+    sync_pose()
     
     # 回転方向を時計回りに固定 (1: 時計回り)
     direction = 1
     
     # 回転速度 (rotate関数と合わせる)
-    ROTATION_SPEED = 40000
+    ROTATION_SPEED = settings.get("edge_rotation")
     
     # マイクロスイッチがオフになるまで回転
     # print("端から離れるまで回転中...")
@@ -126,17 +284,24 @@ def edge_detected_handler():
     while edge_sensor.value() == 1:
         time.sleep(0.1)
     
-    time.sleep(0.5)
+    time.sleep(settings.get("edge_release_ms") / 1000.0)
+    update_pose()
     
     print("端から離れた")
     # オフになったら、そこから10°～80°または100°～170°追加回転
-    if random.randint(0, 1) == 0:
-        additional_angle = random.randint(10, 80)
+    # 角度には回転方向の符号をここで1回だけ付ける
+    if coordinator is not None:
+        # 範囲内の角度をすべて調べ，自分と他の個体が掃除していない場所を
+        # 単位時間あたり最も多く通る向きを選ぶ
+        coordinator.poll()
+        candidates = [direction * a for a in bounce_candidates()]
+        speed = estimator.motion(settings.get("forward_left"), settings.get("forward_right"))[0]
+        additional_angle = candidates[coordinator.choose_turn(bounce_options(candidates), speed)]
     else:
-        additional_angle = random.randint(100, 170)
+        additional_angle = direction * random_bounce_angle()
     
     # そのまま指定角度分回転（rotate関数を使用）
-    rotate(direction * additional_angle, True)
+    rotate(additional_angle, True)
     
     # 回転後、前進再開
     start_forward()
@@ -149,6 +314,7 @@ def check_magnetic_sensors():
     if magnetic_sensor_1.value() == 1:
         print("下方")
         drive(0, 0)
+        correct_landmark()
         led.value(1) # LED点灯
         rotate(-90, False)
         led.value(0) # LED消灯
@@ -158,6 +324,7 @@ def check_magnetic_sensors():
     if magnetic_sensor_2.value() == 1:
         print("上方")
         drive(0, 0)
+        correct_landmark()
         led.value(1) # LED点灯
         rotate(90, False)
         led.value(0) # LED消灯
@@ -167,6 +334,7 @@ def check_magnetic_sensors():
     if magnetic_sensor_3.value() == 1:
         print("後方")
         drive(0, 0)
+        correct_landmark()
         led.value(1) # LED点灯
         rotate(180, False)
         led.value(0) # LED消灯
@@ -177,9 +345,7 @@ def mouth_animation():
     """口開閉アニメーション（別スレッド実行）"""
     ANGLE_CLOSE = 0
     ANGLE_OPEN = 70
-    DURATION = 2000  # 動作時間（ms）
     STEPS = 50       # 分割数
-    STEP_DELAY = DURATION / STEPS / 1000.0
 
     # 初期化：口を閉じる
     set_mouth_angle(ANGLE_CLOSE)
@@ -192,23 +358,53 @@ def mouth_animation():
             angle_step = (target_end - target_start) / STEPS
             for i in range(STEPS):
                 set_mouth_angle(target_start + angle_step * i)
-                time.sleep(STEP_DELAY)
+                time.sleep(settings.get("mouth_step_ms") / 1000.0)
             set_mouth_angle(target_end)
 
+# ==================== 複数台協調 ====================
+def start_fleet():
+    """Wi-Fiに接続して協調を開始（失敗時は単独で動作）"""
+    global coordinator
+    import fleet  # 協調するときだけfleet.pyが必要
+    ip = fleet.connect_wifi(WIFI_SSID, WIFI_PASSWORD)
+    if ip is None:
+        print("Wi-Fi接続失敗: 単独で動作")
+        return
+    print("Wi-Fi接続:", ip)
+    coordinator = fleet.Fleet(ROBOT_ID, DESK_W_MM, DESK_H_MM,
+                              fleet.open_socket(ip))
+    coordinator.mark(pose_x, pose_y)
+
+# ==================== パラメータ調整 ====================
+def stat_report():
+    """statコマンドの応答（PC側で調整結果の記録に使う）"""
+    text = "t_ms=%d edges=%d magnets=%d x=%d y=%d heading=%d" % (
+        time.ticks_ms(), edge_count, magnet_count, pose_x, pose_y, pose_heading)
+    if coordinator is not None:
+        text += " coverage=%.3f" % coordinator.coverage()
+    return text
+
+console = params.Console(settings, {"stat": stat_report})
+
 # ==================== メインループ ====================
 def main():
     """メインプログラム"""
     
     # システム起動
     print("=== システム起動 ===")
-    start_forward()
-    
-    # 口開閉アニメーションスレッド開始
-    _thread.start_new_thread(mouth_animation, ())
-    
-    print("メインループ開始")
+    calibrate_turn()
+    if FLEET_ENABLED:
+        start_fleet()
     
     try:
+        start_forward()
+        
+        # 口開閉アニメーションスレッド開始
+        _thread.start_new_thread(mouth_animation, ())
+        
+        print("メインループ開始")
+        last_broadcast = time.ticks_ms()
+        
         while True:
             # 端検出チェック（押下時HIGHに変更）
             if edge_sensor.value() == 1:
@@ -217,11 +413,24 @@ def main():
             # 磁気センサーチェック
             check_magnetic_sensors()
             
+            # USBシリアルからのパラメータ調整
+            console.poll()
+            
+            # 自己位置の更新と，位置・掃除済みセルの共有
+            update_pose()
+            if coordinator is not None:
+                coordinator.poll()
+                if time.ticks_diff(time.ticks_ms(), last_broadcast) >= BROADCAST_INTERVAL_MS:
+                    coordinator.broadcast(pose_x, pose_y, pose_heading)
+                    last_broadcast = time.ticks_ms()
+            
             time.sleep(0.1)  # 10msごとにループ
             
     except KeyboardInterrupt:
         print("\n=== プログラム終了 ===")
-        drive(0, 0)
+    finally:
+        # どの例外で抜けてもモータを止める（KeyboardInterrupt以外は表示される）
+        stop_motors()
 
 # ==================== プログラム開始 ====================
 if __name__ == "__main__":
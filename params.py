@@ -0,0 +1,201 @@
+"""
+パラメータ調整モジュール
+Raspberry Pi Pico W用 / Linux上でも共通で使用
+MicroPython / CPython
+
+調整用の値をRAM上の構造体（bytearray）にまとめ，USBシリアルから
+走行中に読み書きできるようにする．saveでフラッシュに保存する．
+値は表の範囲と大小関係（最小 <= 最大など）を満たすものだけを受け付ける．
+保存ファイルの先頭には表の並びから求めた署名を書き，表が変わったら読み込まない．
+
+シリアルのコマンド（1行1コマンド）:
+    list              すべての値を表示
+    get 名前          値を表示
+    set 名前 値       値を変更
+    save              フラッシュに保存
+    load              フラッシュから読み込み
+    reset             初期値に戻す
+応答は通常のログと区別できるように "@" で始まる．
+"""
+
+import struct
+import sys
+
+try:
+    import select
+except ImportError:
+    select = None
+
+
+PATH = "params.bin"   # 保存先ファイル（Picoのフラッシュ上）
+PREFIX = "@"          # 応答行の先頭文字
+MAX_LINE = 64         # 1行の最大文字数
+
+SIGNATURE = "<I"      # 保存ファイル先頭の署名
+
+# 整数型の範囲（MicroPythonのstructは範囲外でもエラーにならないため）
+RANGES = {
+    "b": (-0x80, 0x7F), "B": (0, 0xFF),
+    "h": (-0x8000, 0x7FFF), "H": (0, 0xFFFF),
+    "i": (-0x80000000, 0x7FFFFFFF), "I": (0, 0xFFFFFFFF),
+}
+
+
+def _signature(text):
+    """文字列の32ビットハッシュ（FNV-1a，MicroPythonとCPythonで同じ値）"""
+    h = 0x811C9DC5
+    for b in text.encode():
+        h = ((h ^ b) * 0x01000193) & 0xFFFFFFFF
+    return h
+
+
+class Params:
+    """名前付きの値を1つのbytearrayに格納するレジストリ"""
+
+    def __init__(self, table, order=(), path=PATH):
+        # table: (名前, structの型, 初期値, 最小値, 最大値) の並び
+        # order: (名前a, 名前b) の並び．常に a <= b を満たすようにする
+        self.path = path
+        self.fields = {}
+        self.names = []
+        self.defaults = []
+        self.limits = []
+        fmt = "<"
+        for name, kind, default, low, high in table:
+            if kind in RANGES:
+                kind_low, kind_high = RANGES[kind]
+                if low < kind_low or high > kind_high:
+                    raise ValueError("%s: limits exceed %s" % (name, kind))
+            self.fields[name] = (kind, struct.calcsize(fmt), len(self.names))
+            self.names.append(name)
+            self.defaults.append(default)
+            self.limits.append((low, high))
+            fmt += kind
+        self.fmt = fmt
+        self.order = [(self.fields[a][2], self.fields[b][2]) for a, b in order]
+        self.signature = _signature(fmt + "," + ",".join(self.names))
+        self.buf = bytearray(struct.calcsize(fmt))
+        self.check(self.defaults)
+        self.reset()
+
+    def get(self, name):
+        """値を読み出す"""
+        kind, offset, _ = self.fields[name]
+        return struct.unpack_from("<" + kind, self.buf, offset)[0]
+
+    def values(self):
+        """すべての値を表の順に返す"""
+        return list(struct.unpack(self.fmt, self.buf))
+
+    def check(self, values):
+        """表の範囲と大小関係を確かめる（満たさなければValueError）"""
+        for i, value in enumerate(values):
+            low, high = self.limits[i]
+            if not low <= value <= high:
+                raise ValueError("%s out of range %s..%s" % (self.names[i], low, high))
+        for a, b in self.order:
+            if values[a] > values[b]:
+                raise ValueError("%s must be <= %s" % (self.names[a], self.names[b]))
+
+    def set(self, name, value):
+        """値を書き込む（整数型に小数・範囲外・大小関係の崩れはValueError）"""
+        kind, offset, index = self.fields[name]
+        if kind in RANGES:
+            if value != int(value):
+                raise ValueError("%s must be an integer" % name)
+            value = int(value)
+        values = self.values()
+        values[index] = value
+        self.check(values)
+        struct.pack_into("<" + kind, self.buf, offset, value)
+
+    def reset(self):
+        """初期値に戻す"""
+        struct.pack_into(self.fmt, self.buf, 0, *self.defaults)
+
+    def save(self):
+        """フラッシュに保存（先頭に署名）"""
+        with open(self.path, "wb") as f:
+            f.write(struct.pack(SIGNATURE, self.signature))
+            f.write(self.buf)
+
+    def load(self):
+        """フラッシュから読み込み（無い・表と合わない・範囲外の場合はFalseで，値は変えない）"""
+        try:
+            with open(self.path, "rb") as f:
+                data = f.read()
+        except OSError:
+            return False
+        head = struct.calcsize(SIGNATURE)
+        if len(data) != head + len(self.buf):
+            return False
+        if struct.unpack_from(SIGNATURE, data, 0)[0] != self.signature:
+            return False
+        try:
+            self.check(struct.unpack_from(self.fmt, data, head))
+        except ValueError:
+            return False
+        self.buf[:] = data[head:]
+        return True
+
+
+class Console:
+    """USBシリアルのノンブロッキングなコマンド受付"""
+
+    def __init__(self, params, commands=None, stream=None, out=print):
+        # commands: 追加コマンド名 -> 応答文字列を返す関数
+        self.params = params
+        self.commands = commands or {}
+        self.stream = stream or sys.stdin
+        self.out = out
+        self.line = ""
+        self.poller = None
+        if select is not None:
+            self.poller = select.poll()
+            self.poller.register(self.stream, select.POLLIN)
+
+    def poll(self):
+        """届いている文字を読み，1行そろったら実行する（待たない）"""
+        if self.poller is None:
+            return
+        while self.poller.poll(0):
+            ch = self.stream.read(1)
+            if not ch:
+                return
+            if ch in "\r\n":
+                if self.line:
+                    self.out(PREFIX + self.execute(self.line))
+                self.line = ""
+            elif len(self.line) < MAX_LINE:
+                self.line += ch
+
+    def execute(self, line):
+        """1行分のコマンドを実行して応答を返す"""
+        args = line.split()
+        if not args:
+            return "ERR bad command"
+        cmd = args[0]
+        p = self.params
+        try:
+            if cmd == "list":
+                return "OK " + " ".join("%s=%s" % (n, p.get(n)) for n in p.names)
+            if cmd == "get" and len(args) == 2:
+                return "OK %s=%s" % (args[1], p.get(args[1]))
+            if cmd == "set" and len(args) == 3:
+                p.set(args[1], float(args[2]))
+                return "OK %s=%s" % (args[1], p.get(args[1]))
+            if cmd == "save" and len(args) == 1:
+                p.save()
+                return "OK saved"
+            if cmd == "load" and len(args) == 1:
+                return "OK loaded" if p.load() else "ERR no valid saved params"
+            if cmd == "reset" and len(args) == 1:
+                p.reset()
+                return "OK reset"
+            if cmd in self.commands:
+                return "OK " + self.commands[cmd]()
+        except KeyError:
+            return "ERR unknown param"
+        except (ValueError, OverflowError, OSError, struct.error) as e:
+            return "ERR %s" % e
+        return "ERR bad command"
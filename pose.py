@@ -0,0 +1,279 @@
+"""
+自己位置推定モジュール（固定小数点の相補フィルタ）
+Raspberry Pi Pico W用 / Linux上のシミュレーションでも共通で使用
+MicroPython / CPython
+
+モータ指令（とIMUがあればジャイロ）から位置と向きを積分し，
+端検出と磁石の目印で位置を補正する．端での補正量から向きも補正し，
+車輪の係数の誤差による向きのずれの速さを学習する．
+更新処理は整数演算のみで，浮動小数点の確保を行わない．
+
+単位:
+    位置  mm × 256（Q8）
+    向き  1周 = 2^24（+x方向が0，時計回りが正，y軸は下向き）
+"""
+
+import math
+from array import array
+
+
+# ==================== 固定小数点 ====================
+POS_ONE = 256              # 1mm
+TURN = 1 << 24             # 1周
+QUARTER = TURN >> 2
+_TABLE_SHIFT = 16          # 向きの下位16ビットは表の補間に使う
+_FRAC_MASK = (1 << _TABLE_SHIFT) - 1
+_GYRO_K = 2983             # mdeg/s -> 向き単位/s（2^24/360000 × 64）
+_RAD = 2670177             # 1rad（2^24/2π）
+
+# sin表（0°〜90°，64分割，Q14）
+_SIN = array("h", [int(round(16384 * math.sin(i * math.pi / 128))) for i in range(65)])
+
+MAX_STEP_MS = 50           # 1回の積分の最大時間幅
+MIN_LEG_MM = 150           # 向きの補正に使う移動距離の下限
+EDGE_GATE_MM = 200         # 補正量がこれを超える端検出は辺の取り違えとみなして使わない
+AMBIGUOUS_MM = 80          # 2つの辺までの距離の差がこれ以下なら，どちらの辺か曖昧なので使わない
+HEADING_GATE = TURN // 12   # 位置の差から求めた向きの誤差がこれ（30°）を超えたら使わない
+MAX_HEADING_FIX = TURN // 72  # 1回の補正で変える向きの上限（5°）
+DRIFT_GAIN = 64            # 向きの補正から，向きのずれの速さを学習する強さ（0〜256）
+MAX_DRIFT = TURN // 720    # 学習する向きのずれの速さの上限（0.5°/s）
+
+
+def sin_q14(a):
+    """sin（引数は向き単位，戻り値はQ14）"""
+    a &= TURN - 1
+    quad = a // QUARTER
+    r = a % QUARTER
+    if quad & 1:
+        r = QUARTER - r
+    i = r >> _TABLE_SHIFT
+    f = (r & _FRAC_MASK) >> 8
+    v = _SIN[i]
+    if f:
+        v += ((_SIN[i + 1] - v) * f) >> 8
+    return -v if quad >= 2 else v
+
+
+def cos_q14(a):
+    """cos（引数は向き単位，戻り値はQ14）"""
+    return sin_q14(a + QUARTER)
+
+
+def deg_to_turn(deg):
+    """度を向き単位に変換"""
+    return int(deg * TURN / 360) & (TURN - 1)
+
+
+# ==================== 自己位置推定 ====================
+class Pose:
+    """差動二輪の推測航法 + 端・目印による補正"""
+
+    def __init__(self, x_mm, y_mm, heading_deg, desk_w, desk_h,
+                 gain_l, gain_r, track_mm,
+                 gyro_weight=0, edge_gain=224, landmark_gain=224, edge_offset_mm=0,
+                 heading_gain=192):
+        self.x = int(x_mm * POS_ONE)
+        self.y = int(y_mm * POS_ONE)
+        self.heading = deg_to_turn(heading_deg)
+        self.desk_w = desk_w
+        self.desk_h = desk_h
+        # 車輪速度 = duty × gain（mm/s）
+        self.gain_l = gain_l
+        self.gain_r = gain_r
+        self.set_track(track_mm)
+        self.gyro_weight = gyro_weight    # ジャイロの重み（0〜256）
+        self.edge_gain = edge_gain        # 端での補正の強さ（0〜256）
+        self.landmark_gain = landmark_gain
+        self.edge_offset = edge_offset_mm # 中心からマイクロスイッチまでの距離
+        self.heading_gain = heading_gain  # 端での補正量から向きを補正する強さ（0〜256）
+        self.xfix_dx = self.xfix_dy = 0   # x座標を補正してからの移動量（Q8 mm，旋回中も含む）
+        self.yfix_dx = self.yfix_dy = 0   # y座標を補正してからの移動量
+        self.v = 0                        # 前進速度（Q8 mm/s）
+        self.rate = 0                     # 角速度（向き単位/s）
+        self.drift = 0                    # 学習した向きのずれの速さ（向き単位/s）
+        self.fix_ms = 0                   # 前回向きを補正してからの走行時間
+
+    # ---------- 設定 ----------
+    def set_track(self, track_mm):
+        """車輪間隔（mm）を設定"""
+        # 角速度 = (左 - 右) / 車輪間隔 を向き単位/sに変換する係数
+        self.omega_k = TURN / (2 * math.pi * track_mm * POS_ONE)
+
+    def set_turn_rate(self, left_speed, right_speed, deg_s):
+        """指令 (left, right) での旋回が deg_s になるように実効車輪間隔を合わせる"""
+        dv = left_speed * self.gain_l - right_speed * self.gain_r
+        self.set_track(abs(dv) * 180 / (math.pi * deg_s))
+
+    def turn_ms(self, angle_deg):
+        """現在の指令で angle_deg 回るのにかかる時間（ms，旋回しない指令ならNone）"""
+        if not self.rate:
+            return None
+        return int(abs(angle_deg) * 1000 * TURN / (360 * abs(self.rate)))
+
+    def motion(self, left_speed, right_speed):
+        """指令 (left, right) での (前進速度 mm/s, 角速度 °/s)（予測用）"""
+        vl = left_speed * self.gain_l
+        vr = right_speed * self.gain_r
+        return (vl + vr) / 2, (vl - vr) * self.omega_k * POS_ONE * 360 / TURN
+
+    def predict(self, left_speed, right_speed, ms):
+        """今の推定値から指令 (left, right) で ms 進んだあとの (x mm, y mm, 向き°)"""
+        v, w = self.motion(left_speed, right_speed)
+        h0 = self.heading * 2 * math.pi / TURN
+        h1 = h0 + math.radians(w * ms / 1000)
+        x = self.x / POS_ONE
+        y = self.y / POS_ONE
+        if abs(h1 - h0) < 1e-6:
+            x += v * ms / 1000 * math.cos(h0)
+            y += v * ms / 1000 * math.sin(h0)
+        else:
+            # 円弧（半径 = 前進速度 / 角速度）に沿って動く
+            r = v * ms / 1000 / (h1 - h0)
+            x += r * (math.sin(h1) - math.sin(h0))
+            y += r * (math.cos(h0) - math.cos(h1))
+        return x, y, math.degrees(h1) % 360
+
+    # ---------- 入力 ----------
+    def command(self, left_speed, right_speed):
+        """モータ指令（drive関数と同じduty値）を設定（指令変更時のみ呼ぶ）"""
+        vl = left_speed * self.gain_l * POS_ONE
+        vr = right_speed * self.gain_r * POS_ONE
+        self.v = int((vl + vr) / 2)
+        self.rate = int((vl - vr) * self.omega_k)
+
+    def update(self, dt_ms, gyro_mdps=None):
+        """dt_ms分だけ積分（gyro_mdpsはIMUの角速度 mdeg/s，時計回りが正）"""
+        rate = self.rate
+        if self.v or rate:
+            rate += self.drift     # 止まっているときはずれない
+            self.fix_ms += dt_ms
+        if gyro_mdps is not None and self.gyro_weight:
+            gyro = (gyro_mdps * _GYRO_K) >> 6
+            w = self.gyro_weight
+            rate = (gyro * w + rate * (256 - w)) >> 8
+        while dt_ms > 0:
+            dt = dt_ms if dt_ms < MAX_STEP_MS else MAX_STEP_MS
+            dt_ms -= dt
+            dh = rate * dt // 1000
+            if self.v:
+                # 区間の中間の向きで進める
+                mid = self.heading + (dh >> 1)
+                ds = self.v * dt // 1000
+                mx = (ds * cos_q14(mid)) >> 14
+                my = (ds * sin_q14(mid)) >> 14
+                self.x += mx
+                self.y += my
+                self.xfix_dx += mx
+                self.xfix_dy += my
+                self.yfix_dx += mx
+                self.yfix_dy += my
+            self.heading = (self.heading + dh) & (TURN - 1)
+        self._clamp()
+
+    # ---------- 補正 ----------
+    def edge_hit(self):
+        """端を検出したとき，進行方向にある机の端の座標だけを補正（補正しなければFalse）"""
+        c = cos_q14(self.heading)
+        s = sin_q14(self.heading)
+        x = self.x >> 8
+        y = self.y >> 8
+        dx = (self.desk_w - x) if c > 0 else x
+        dy = (self.desk_h - y) if s > 0 else y
+        # 向きの誤差に左右されにくいよう，推定位置から近い方の辺とみなす
+        if abs(dx - dy) < AMBIGUOUS_MM:
+            return False  # 角の近くではどちらの辺か分からない
+        # スイッチが端にあるときの中心位置との差
+        if dx < dy:
+            off = (self.edge_offset * abs(c)) >> 14
+            e = ((self.desk_w - off) if c > 0 else off) * POS_ONE - self.x
+        else:
+            off = (self.edge_offset * abs(s)) >> 14
+            e = ((self.desk_h - off) if s > 0 else off) * POS_ONE - self.y
+        if abs(e) > EDGE_GATE_MM * POS_ONE:
+            return False
+        # 辺から遠ざける向き（反対側の辺の方）への補正はスイッチの位置の分まで
+        toward = c > 0 if dx < dy else s > 0
+        if (e > 0) != toward and abs(e) > self.edge_offset * POS_ONE:
+            return False
+        # 向きがδずれていると，前回同じ座標を補正してからの移動量のうち
+        # x方向の差は -δ×(y成分)，y方向の差は δ×(x成分) になる．移動が辺に
+        # ほぼ垂直なときは速度の誤差と区別できないので向きは補正しない
+        if dx < dy:
+            lx = self.xfix_dx >> 8
+            ly = self.xfix_dy >> 8
+        else:
+            lx = self.yfix_dx >> 8
+            ly = self.yfix_dy >> 8
+        lat = -ly if dx < dy else lx
+        along = lx if dx < dy else ly
+        if abs(lat) >= MIN_LEG_MM and 2 * abs(lat) >= abs(along):
+            self._turn(e * _RAD // (lat * POS_ONE), dx < dy, toward)
+        e = (e * self.edge_gain) >> 8
+        if dx < dy:
+            self.x += e
+            self.xfix_dx = self.xfix_dy = 0
+        else:
+            self.y += e
+            self.yfix_dx = self.yfix_dy = 0
+        return True
+
+    def landmark(self, landmarks, gate_mm):
+        """磁石を検出したとき，近くの目印の位置へ寄せる（該当なしはFalse）"""
+        x = self.x >> 8
+        y = self.y >> 8
+        best = None
+        best_d = gate_mm * gate_mm
+        for lx, ly in landmarks:
+            d = (lx - x) * (lx - x) + (ly - y) * (ly - y)
+            if d <= best_d:
+                best = (lx, ly)
+                best_d = d
+        if best is None:
+            return False
+        # 目印の位置は置き方の精度に左右されるので位置だけを寄せ，
+        # 向きの補正と学習には使わない（シミュレーションでは使うと悪化した）
+        g = self.landmark_gain
+        self.x += ((best[0] * POS_ONE - self.x) * g) >> 8
+        self.y += ((best[1] * POS_ONE - self.y) * g) >> 8
+        return True
+
+    def _turn(self, dh, x_wall, toward):
+        """補正で求めた向きの誤差 dh（向き単位）を heading_gain の割合で，上限付きで反映
+        （dhが大きすぎるときと，補正後に当たった辺の方を向かなくなるときは使わない）"""
+        if abs(dh) > HEADING_GATE:
+            return
+        dh = (dh * self.heading_gain) >> 8
+        if dh > MAX_HEADING_FIX:
+            dh = MAX_HEADING_FIX
+        elif dh < -MAX_HEADING_FIX:
+            dh = -MAX_HEADING_FIX
+        heading = (self.heading + dh) & (TURN - 1)
+        v = cos_q14(heading) if x_wall else sin_q14(heading)
+        if (v > 0) != toward:
+            return  # 辺に当たれない向きになるので使わない
+        self.heading = heading
+        # 前回の補正からのずれは，係数の誤差で一定の速さでずれた分とみなして学習
+        if self.fix_ms:
+            drift = self.drift + dh * DRIFT_GAIN * 1000 // (256 * self.fix_ms)
+            if drift > MAX_DRIFT:
+                drift = MAX_DRIFT
+            elif drift < -MAX_DRIFT:
+                drift = -MAX_DRIFT
+            self.drift = drift
+            self.fix_ms = 0
+
+    def _clamp(self):
+        """机の外に出ないように制限"""
+        if self.x < 0:
+            self.x = 0
+        elif self.x > self.desk_w * POS_ONE:
+            self.x = self.desk_w * POS_ONE
+        if self.y < 0:
+            self.y = 0
+        elif self.y > self.desk_h * POS_ONE:
+            self.y = self.desk_h * POS_ONE
+
+    # ---------- 出力 ----------
+    def get(self):
+        """(x mm, y mm, 向き°) を返す"""
+        return (self.x >> 8, self.y >> 8, ((self.heading >> 8) * 360) >> 16)
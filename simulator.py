@@ -0,0 +1,82 @@
+"""
+シミュレーション共通の実機モデル
+Linux(CPython)上で使用（Pose-Sim.py, Fleet-Sim.py）
+
+車輪の係数や車輪間隔に誤差のある「実機」の動きを再現する．
+推定側（pose.py）はこの誤差を知らない．
+"""
+
+import math
+
+
+# ==================== 実機の設定 ====================
+DESK_W_MM = 1200
+DESK_H_MM = 900
+WHEEL_GAIN_L = 100 / 20000    # 推定側が使う公称値
+WHEEL_GAIN_R = 100 / 24000
+TRACK_MM = 350
+SUB_MS = 10                   # 実機モデルの積分周期
+EDGE_OFFSET_MM = 40           # 中心からマイクロスイッチまでの距離
+
+ROTATION_DEG_S = 60           # main.pyのrotation_ddeg_sの初期値（°/s）
+MAX_TURN_MS = 8000            # main.pyと同じ，1回の回転で待つ時間の上限
+
+FORWARD = (20000, 24000)
+SPIN = (40000, -40000)
+PIVOT = (0, -40000)
+
+
+def turn_wait_ms(est, angle, lr, model_timing):
+    """main.pyのturn_wait_ms()と同じ，指令 lr で angle 回るための待ち時間（ms）"""
+    if model_timing:
+        deg_s = abs(est.motion(*lr)[1])
+    else:
+        deg_s = ROTATION_DEG_S
+    return min(abs(angle) * 1000 / deg_s, MAX_TURN_MS)
+
+
+class Truth:
+    """誤差を含む実機の走行モデル"""
+
+    def __init__(self, rng):
+        self.rng = rng
+        self.x = rng.uniform(200, DESK_W_MM - 200)
+        self.y = rng.uniform(200, DESK_H_MM - 200)
+        self.heading = rng.uniform(0, 360)
+        self.gain_l = WHEEL_GAIN_L * rng.uniform(0.98, 1.02)
+        self.gain_r = WHEEL_GAIN_R * rng.uniform(0.98, 1.02)
+        self.track = TRACK_MM * rng.uniform(0.98, 1.02)
+        self.gyro_bias = rng.uniform(-50, 50)     # mdeg/s（起動時の補正後）
+        self.left = 0
+        self.right = 0
+        self.rate = 0.0
+
+    def step(self, dt_ms):
+        noise = self.rng.gauss(1.0, 0.03)
+        vl = self.left * self.gain_l * noise
+        vr = self.right * self.gain_r * self.rng.gauss(1.0, 0.03)
+        v = (vl + vr) / 2
+        self.rate = math.degrees((vl - vr) / self.track)
+        mid = math.radians(self.heading + self.rate * dt_ms / 2000)
+        self.x += v * math.cos(mid) * dt_ms / 1000
+        self.y += v * math.sin(mid) * dt_ms / 1000
+        self.heading = (self.heading + self.rate * dt_ms / 1000) % 360
+        # 机の外には出られないものとする
+        self.x = min(max(self.x, 0), DESK_W_MM)
+        self.y = min(max(self.y, 0), DESK_H_MM)
+
+    def switch_off_desk(self):
+        """マイクロスイッチが机の外に出たか"""
+        rad = math.radians(self.heading)
+        x = self.x + EDGE_OFFSET_MM * math.cos(rad)
+        y = self.y + EDGE_OFFSET_MM * math.sin(rad)
+        return not (0 <= x <= DESK_W_MM and 0 <= y <= DESK_H_MM)
+
+    def gyro(self):
+        return int(self.rate * 1000 + self.gyro_bias + self.rng.gauss(0, 300))
+
+    def near_magnet(self, landmarks, radius):
+        for lx, ly in landmarks:
+            if (lx - self.x) ** 2 + (ly - self.y) ** 2 <= radius ** 2:
+                return True
+        return False